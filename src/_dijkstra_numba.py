@@ -0,0 +1,98 @@
+'''
+
+    Numba-compiled Dijkstra kernel operating on the CSR arrays built by Graph._freeze().
+
+    The priority queue is a binary min-heap kept in two parallel arrays (heap_key, heap_node),
+    with a pos array mapping each node to its slot (-1 if absent) so that keys are decreased
+    in place and the heap never holds more than N entries.
+
+'''
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def sssp_csr(indptr, indices, weights, src):
+
+    '''
+        Find the distances from src to every node of the graph given in CSR form
+
+        @param indptr           row pointers, neighbours of u are indices[indptr[u]:indptr[u+1]]
+        @param indices          neighbour node of every edge
+        @param weights          distance of every edge
+        @param src              the start node
+
+        @return                 the float64 array of distances, inf for unreachable nodes
+
+    '''
+
+    n = indptr.size - 1
+    D = np.full(n, np.inf)
+    heap_key = np.empty(n, dtype=np.float64)
+    heap_node = np.empty(n, dtype=np.int64)
+    pos = np.full(n, -1, dtype=np.int64)
+    settled = np.zeros(n, dtype=np.uint8)
+
+    D[src] = 0.0
+    heap_key[0] = 0.0
+    heap_node[0] = src
+    pos[src] = 0
+    size = 1
+
+    while size > 0:
+
+        # ----- pop the minimum, move the last entry to the root and sift it down
+        u = heap_node[0]
+        d = heap_key[0]
+        pos[u] = -1
+        size -= 1
+        settled[u] = 1
+
+        if size > 0:
+            node = heap_node[size]
+            key = heap_key[size]
+            i = 0
+            while True:
+                child = 2 * i + 1
+                if child >= size:
+                    break
+                if child + 1 < size and heap_key[child + 1] < heap_key[child]:
+                    child += 1
+                if key <= heap_key[child]:
+                    break
+                heap_key[i] = heap_key[child]
+                heap_node[i] = heap_node[child]
+                pos[heap_node[i]] = i
+                i = child
+            heap_key[i] = key
+            heap_node[i] = node
+            pos[node] = i
+
+        # ----- relax the edges of u, pushing or decreasing the key of improved neighbours
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            if settled[v]:
+                continue
+            nd = d + weights[e]
+            if nd < D[v]:
+                D[v] = nd
+                i = pos[v]
+                if i < 0:
+                    i = size
+                    size += 1
+
+                # ----- sift up
+                while i > 0:
+                    parent = (i - 1) >> 1
+                    if heap_key[parent] <= nd:
+                        break
+                    heap_key[i] = heap_key[parent]
+                    heap_node[i] = heap_node[parent]
+                    pos[heap_node[i]] = i
+                    i = parent
+                heap_key[i] = nd
+                heap_node[i] = v
+                pos[v] = i
+
+    return D
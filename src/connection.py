@@ -6,37 +6,24 @@
     where the node Y of the connection is connected to node X with weight (or distance)
     given by the distance of this connection.
 
-'''
+    A connection is a plain (node, distance) tuple with named fields, so it costs no
+    more than a tuple per edge and compares/hashes like one.
 
-class Connection:
+'''
 
-    def __init__(self, node, distance):
+from collections import namedtuple
 
-        self._node = node
-        self._distance = distance
+class Connection(namedtuple("Connection", "node distance")):
 
-    @property
-    def node(self):
-        return self._node
-    
-    @property
-    def distance(self):
-        return self._distance
+    __slots__ = ()
 
     def hash_code(self):
 
-        prime = 31
-        result = 1
-        result = prime * result + distance
-        result = prime * result + node
-        return result
-    
-    def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        # ----- same value as hash(), which the tuple base already keeps consistent with ==
+        return hash((self[0], self[1]))
 
     def __str__(self):
-        return "< Node: %d, Distance: %d >"%(self._node, self._distance)
+        return "< Node: %d, Distance: %d >"%(self[0], self[1])
 
     def __repr__(self):
-        return "< Node: %d, Distance: %d >"%(self._node, self._distance)
-
+        return "< Node: %d, Distance: %d >"%(self[0], self[1])
@@ -1,23 +1,199 @@
 # import queue
-import heapq
+import numbers
+from array import array
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 from src import Connection
 
+try:
+    from src._dijkstra_numba import sssp_csr
+except ImportError:
+    # ----- numba is optional: without it the pure-Python indexed heap is used
+    sssp_csr = None
+
+# ----- number of source nodes whose distances Graph.dijkstra() keeps, least recently used dropped first
+_SSSP_CACHE_SIZE = 8
+
+# ----- rows with more edges than this are relaxed with NumPy vector operations in the pure-Python Dijkstra
+_VECTORIZED_DEGREE = 32
+
+# ----- rows with more edges than this get a neighbour -> position dict for add_edge(), smaller ones are scanned
+_INDEXED_DEGREE = 64
+
+
 class GraphException(Exception):
     def __init___(self, d_error_arguments):
         Exception.__init__(self, "Graph Exception was raised with arguments {0}".format(d_error_arguments))
         self._d_error_arguments = d_error_arguments
 
 
+def _is_node_id(node):
+    '''
+        Check that a value given by the caller can be stored as an int64 node id: an integer, or an
+        integral float, in the int64 range.
+
+    '''
+    if not isinstance(node, numbers.Real) or not -2**63 <= node < 2**63:
+        return False
+    return isinstance(node, numbers.Integral) or float(node).is_integer()
+
+
+# ----- frozen CSR form of a graph, see Graph._freeze(); the maps are None while rows are the node ids themselves
+_CSR = namedtuple("_CSR", "indptr indices weights node_to_idx idx_to_node")
+
+
+def _to_csr(nodes, indptr, indices, weights):
+    '''
+        Finish a CSR form whose rows are the sorted node ids given, but whose indices are still
+        node ids. Rows are dense indices 0..N-1 whatever the ids, so when the ids are not exactly
+        0..N-1 the neighbours are relabelled to rows and the maps between the two are kept.
+
+        @param nodes            the sorted NumPy array of node ids, one per row
+        @param indptr           row pointers into indices and weights
+        @param indices          neighbour node id of every edge
+        @param weights          distance of every edge
+
+        @return                 the _CSR
+
+    '''
+    if len(nodes) == 0 or (nodes[0] == 0 and nodes[-1] == len(nodes) - 1):
+        return _CSR(indptr, indices, weights, None, None)
+
+    node_to_idx = dict(zip(nodes.tolist(), range(len(nodes))))
+    return _CSR(indptr, np.searchsorted(nodes, indices), weights, node_to_idx, nodes)
+
+
+class _IndexedDHeap:
+
+    '''
+        A 4-ary min-heap of the node indices 0..N-1, keyed by a float per node. The arity is
+        built into the index arithmetic: the children of slot i are (i << 2) + 1 .. (i << 2) + 4.
+
+        pos[] records where each node sits in the heap (-1 if absent), so a node
+        is stored at most once and its key can be decreased in place instead of
+        pushing a duplicate entry.
+
+    '''
+
+    __slots__ = ("keys", "heap", "pos")
+
+    def __init__(self, n):
+
+        # ----- contiguous doubles rather than a list of boxed floats
+        self.keys = array('d', [float('inf')]) * n
+        self.heap = []
+        self.pos = [-1] * n
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push_or_decrease(self, node, key):
+        '''
+            Insert the node with the given key, or lower its key if it is already in the heap.
+
+            @param node             the node index
+            @param key              the new key; ignored if not smaller than the current one
+
+        '''
+        i = self.pos[node]
+        if i < 0:
+            self.keys[node] = key
+            i = len(self.heap)
+            self.heap.append(node)
+            self.pos[node] = i
+        elif key < self.keys[node]:
+            self.keys[node] = key
+        else:
+            return
+        self._sift_up(i)
+
+    def min_key(self):
+        '''
+            @return                 the smallest key in the heap, infinity if the heap is empty
+
+        '''
+        return self.keys[self.heap[0]] if self.heap else float('inf')
+
+    def pop_min(self):
+        '''
+            Remove and return the node with the smallest key
+
+            @return                 the (node, key) pair
+
+        '''
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.pos[top] = -1
+        if heap:
+            heap[0] = last
+            self.pos[last] = 0
+            self._sift_down(0)
+        return top, self.keys[top]
+
+    def _sift_up(self, i):
+
+        heap, keys, pos = self.heap, self.keys, self.pos
+        node = heap[i]
+        key = keys[node]
+        while i > 0:
+            parent = (i - 1) >> 2
+            p = heap[parent]
+            if keys[p] <= key:
+                break
+            heap[i] = p
+            pos[p] = i
+            i = parent
+        heap[i] = node
+        pos[node] = i
+
+    def _sift_down(self, i):
+
+        heap, keys, pos = self.heap, self.keys, self.pos
+        n = len(heap)
+        node = heap[i]
+        key = keys[node]
+        while True:
+            first = (i << 2) + 1
+            if first >= n:
+                break
+
+            # ----- pick the smallest of the (at most 4) children
+            best = first
+            best_key = keys[heap[first]]
+            c = first + 1
+            if c < n and keys[heap[c]] < best_key:
+                best, best_key = c, keys[heap[c]]
+            c += 1
+            if c < n and keys[heap[c]] < best_key:
+                best, best_key = c, keys[heap[c]]
+            c += 1
+            if c < n and keys[heap[c]] < best_key:
+                best, best_key = c, keys[heap[c]]
+
+            if key <= best_key:
+                break
+            child = heap[best]
+            heap[i] = child
+            pos[child] = i
+            i = best
+        heap[i] = node
+        pos[node] = i
+
 
 
 
 class Graph:
 
+    __slots__ = ("_nbr", "_wgt", "_index", "_weight_type", "_frozen", "_sssp_cache")
+
     def __init__(self, connections = None):
         '''
             Create a graph from an array of edges. Each edge is itself an array of 3 integers,
-            the source node, the destination node and the distance between them. Nodes have to be
-            sequential (eg. a node called 7 should not be present in graph unless there are nodes 0 to 6 already in it)
+            the source node, the destination node and the distance between them. Node ids do not
+            have to be sequential: they are mapped to dense indices whenever the graph is frozen.
+            Path lengths are summed as doubles, so integer distances are exact up to 2**53.
             
             Each edge in the input array will be added using 'addEdge(node1,node2,distance)}'
             implying that the reverse of each edge is also added and should NOT be explicitly in
@@ -28,60 +204,239 @@ class Graph:
 
         '''  
 
-        self._graph = {}
+        # ----- adjacency lists as parallel arrays: the neighbours of node u and the distances to them
+        self._nbr = {}
+        self._wgt = {}
+
+        # ----- u -> {v: position of v in the arrays of u}, only for rows above _INDEXED_DEGREE, see _find()
+        self._index = {}
+
+        # ----- typecode of the distance arrays, switched to 'd' once a non-integer distance is added
+        self._weight_type = 'q'
+
+        # ----- read-only _CSR form of the adjacency, built lazily by _freeze() and dropped on every mutation
+        self._frozen = None
+
+        # ----- source node -> distances to every row, kept by dijkstra() and cleared on every change
+        self._sssp_cache = OrderedDict()
 
         if connections is not None:
+            self._load_edges(connections)
+
+
+
+    def _load_edges(self, connections):
+        '''
+            Add all the edges given to the constructor at once: the input is validated as a single
+            (E, 3) NumPy array, both directions are sorted by source node into the CSR form, and the
+            adjacency lists are then cut out of the CSR arrays. Equivalent to calling add_edge() for
+            each edge (self-loops stored once, parallel edges merged into the shortest one), but
+            without 2E Python-level appends and checks.
+
+            @param connections      the array of edges to add
+            @raises GraphException  if there are not exactly 3 integers in each edge array, a node
+                                        id is not an integer, or a distance is negative
 
+        '''
+        if not hasattr(connections, '__len__'):
+            connections = list(connections)
+        if len(connections) == 0:
+            return
+
+        try:
+            arr = np.asarray(connections)
+        except ValueError:
+            arr = None
+
+        if arr is None or arr.ndim != 2 or arr.shape[1] != 3:
+            # ----- error path only: find the offending edge for the message
             for connection in connections:
                 if len(connection) != 3:
                     raise GraphException("Connections in Graphs must have 3 integers: node 1, node 2 and the distance between them. This connection did not: " + str(connection)) 
-                self.add_edge(connection[0], connection[1], connection[2])
-
+            raise GraphException("Connections in Graphs must have 3 integers: node 1, node 2 and the distance between them")
+
+        # ----- node ids must be integral, a cast alone would silently truncate 0.5 to node 0. Float ids
+        # ----- are accepted when integral, as any float distance makes NumPy store the ids as floats too
+        ids = arr[:, :2]
+        nodes = None
+        if ids.dtype.kind in 'iub':
+            nodes = ids.astype(np.int64)
+        elif ids.dtype.kind == 'f' and np.all((ids >= -2**63) & (ids < 2**63)):
+            nodes = ids.astype(np.int64)
+            if np.any(nodes != ids):
+                nodes = None
+
+        if nodes is None:
+            # ----- error path, or ids of mixed Python types: find the offending edge for the message
+            for node1, node2, distance in connections:
+                if not (_is_node_id(node1) and _is_node_id(node2)):
+                    raise GraphException("Node ids must be integers: attempted to add node %s to node %s with distance %s"%(node1, node2, distance))
+            nodes = ids.astype(np.int64)
+
+        distances = arr[:, 2]
+
+        negative = np.flatnonzero(distances < 0)
+        if negative.size:
+            node1, node2, distance = connections[negative[0]]
+            raise GraphException("All distances must be greater than or equal to 0: attempted to add node %d to node %d with distance %d"%(node1, node2, distance))
 
+        # ----- every edge in both directions, grouped by source node then neighbour, shortest first
+        src = np.concatenate((nodes[:, 0], nodes[:, 1]))
+        dst = np.concatenate((nodes[:, 1], nodes[:, 0]))
+        weights = np.concatenate((distances, distances))
+        order = np.lexsort((weights, dst, src))
+        src, dst, weights = src[order], dst[order], weights[order]
+
+        # ----- keep only the shortest of parallel edges; the two directions of a self-loop collapse here too
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, indices, weights = src[first], dst[first], weights[first]
+
+        # ----- the row of each edge is the index of its source among the sorted node ids
+        nodes, rows = np.unique(src, return_inverse=True)
+        n = len(nodes)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        if weights.dtype.kind not in 'iub':
+            self._weight_type = 'd'
+            weights = weights.astype(np.float64)
+        else:
+            weights = weights.astype(np.int64)
+
+        # ----- each row is allocated once at its exact degree, copied straight out of the CSR buffers
+        ptr = (indptr * 8).tolist()
+        nbr_bytes = memoryview(indices).cast('B')
+        wgt_bytes = memoryview(weights).cast('B')
+        for i, u in enumerate(nodes.tolist()):
+            lo, hi = ptr[i], ptr[i + 1]
+            self._nbr[u] = nbr = array('q')
+            nbr.frombytes(nbr_bytes[lo:hi])
+            self._wgt[u] = wgt = array(self._weight_type)
+            wgt.frombytes(wgt_bytes[lo:hi])
+
+        self._frozen = _to_csr(nodes, indptr, indices, weights)
 
     def add_edge(self, node1, node2, distance):
         '''
             Add an edge to the graph
         
             This graph is UNDIRECTED, so any time we add an edge we must add the reverse edge as well.
+            A self-loop is stored once, and adding an edge that already exists only keeps the shorter
+            of the two distances, as Dijkstra would never use the longer one.
         
             param node1             The source node
             param node2             The destination node
             param distance          The distance or weight on the edge
 
-            raises GraphException   if the distance is negative
+            raises GraphException   if a node id is not an integer in the int64 range, or the
+                                        distance is negative
 
         '''
-        
+
+        # ----- checked before anything is changed: the arrays only hold int64 node ids
+        for node in (node1, node2):
+            if not isinstance(node, numbers.Integral) or not -2**63 <= node < 2**63:
+                raise GraphException("Node ids must be integers: attempted to add node %s to node %s with distance %s"%(node1, node2, distance))
+
         if distance < 0:
             raise GraphException("All distances must be greater than or equal to 0: attempted to add node %d to node %d with distance %d"%(node1, node2, distance))
 
-        if node1 not in self._graph:
-            self._graph[node1] = []
+        self._frozen = None
+        self._sssp_cache.clear()
+
+        if self._weight_type == 'q' and not isinstance(distance, numbers.Integral):
+            self._use_float_weights()
+
+        if node1 not in self._nbr:
+            self._nbr[node1] = array('q')
+            self._wgt[node1] = array(self._weight_type)
 
-        self._graph[node1].append(Connection(node2, distance))
+        # ----- parallel edge: lower the existing distance in both directions if needed
+        k = self._find(node1, node2)
+        if k >= 0:
+            if distance < self._wgt[node1][k]:
+                self._wgt[node1][k] = distance
+                self._wgt[node2][self._find(node2, node1)] = distance
+            return
+
+        self._append(node1, node2, distance)
+
+        if node1 == node2:
+            return
 
         # ----- also add the reverse connection
-        if node2 not in self._graph:
-            self._graph[node2] = []
+        if node2 not in self._nbr:
+            self._nbr[node2] = array('q')
+            self._wgt[node2] = array(self._weight_type)
+
+        self._append(node2, node1, distance)
+
+    def _find(self, u, v):
+        '''
+            Get the position of v in the arrays of u, or -1 if u has no edge to v. Rows up to
+            _INDEXED_DEGREE edges are scanned with array.index(); larger ones get a position dict,
+            built on first use and kept up to date by _append() and contract_node_with_two_edges().
+
+        '''
+        nbr = self._nbr[u]
+        index = self._index.get(u)
+        if index is None:
+            if len(nbr) <= _INDEXED_DEGREE:
+                try:
+                    return nbr.index(v)
+                except ValueError:
+                    return -1
+            self._index[u] = index = dict(zip(nbr.tolist(), range(len(nbr))))
+        return index.get(v, -1)
+
+    def _append(self, u, v, distance):
+        '''
+            Append an edge u -> v at the end of the arrays of u
+
+        '''
+        index = self._index.get(u)
+        if index is not None:
+            index[v] = len(self._nbr[u])
+        self._nbr[u].append(v)
+        self._wgt[u].append(distance)
 
-        self._graph[node2].append(Connection(node1, distance))
+
+    def _use_float_weights(self):
+        '''
+            Convert all the distance arrays to doubles, so that non-integer distances can be stored
+
+        '''
+        self._weight_type = 'd'
+        for u in self._wgt:
+            self._wgt[u] = array('d', self._wgt[u])
 
 
     def get_connections(self):
         '''
             Get an array of edges in the same form as the array of edges Graph constructor, except that
             this method returns ALL the individual edges, thus one for the forward and one for the reverse direction of each true edge.
+            Edges are listed by source node, in increasing node order. The edges of a node are in
+            the order they were added (by neighbour for the constructor's edges), except that a
+            contraction moves the last edge of each neighbour into the place of the removed one.
+            Node ids are always ints, distances are floats once any distance in the graph is.
 
             @return the array of edges in the graph
 
         '''
-        connections = []
-        for node in self._graph:
-            for edge in self._graph[node]:
-                connections.append([node, edge.node, edge.distance])
+        indptr, indices, weights, _, node_ids = self._freeze()
+        src = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+        if node_ids is not None:
+            # ----- rows are mapped (non-contiguous ids or reorder_rcm()), go back to node ids and node order
+            order = np.argsort(node_ids[src], kind='stable')
+            src, indices, weights = node_ids[src][order], node_ids[indices][order], weights[order]
 
-        return connections
+        if weights.dtype.kind == 'i':
+            return np.column_stack((src, indices, weights)).tolist()
+
+        # ----- stacking would turn the node ids into floats as well, keep them as ints
+        return list(map(list, zip(src.tolist(), indices.tolist(), weights.tolist())))
 
     def contract_node_with_two_edges(self, node):
 
@@ -92,33 +447,173 @@ class Graph:
             distance a and node B with distance b, then this will remove both the X-A and the X-B
             edge (essentially removing X from the graph), and add a new edge (A-B) with distance a+b
 
-            Pre-existing edge between A and B are not be changed
-            or removed.
+            A pre-existing edge between A and B is not removed, but it takes the distance a+b if that
+            is shorter (see add_edge).
 
             @param node             the node to be contracted
-            @raises GraphException  if the node to be contracted does not exist in the graph or
-                                        does not have precisely two edges
+            @raises GraphException  if the node to be contracted does not exist in the graph,
+                                        does not have precisely two edges or has a self-loop
             
         '''
-        if node not in self._graph:
+        if node not in self._nbr:
             raise GraphException("Graph does not have the given node: %d"%node)
 
-        if len(self._graph[node]) != 2:
-            raise GraphException("The number of connections for the node '%d' has to be 2. It was %d"%(node,len(self._graph[node])))
+        if len(self._nbr[node]) != 2:
+            raise GraphException("The number of connections for the node '%d' has to be 2. It was %d"%(node,len(self._nbr[node])))
 
-        connections = self._graph[node]
+        # ----- a self-loop is stored once, so it can pass the count above without being contractible
+        if node in self._nbr[node]:
+            raise GraphException("The node '%d' to be contracted has a self-loop"%node)
 
-        # ----- remove node from graph
-        del(self._graph[node])
+        self._frozen = None
+        self._sssp_cache.clear()
 
-        for connection in connections:
-            for inv_connection in self._graph[connection.node]:
-                if inv_connection.node == node:
-                    self._graph[connection.node].remove(inv_connection)
+        # ----- remove node from graph
+        nbr = self._nbr.pop(node)
+        wgt = self._wgt.pop(node)
+        self._index.pop(node, None)
+
+        # ----- parallel edges are merged on insert, so each neighbour holds exactly one reverse connection:
+        # ----- move the last entry of the neighbour's arrays into its slot and drop the last one
+        for a in nbr:
+            k = self._find(a, node)
+            nbr_a, wgt_a = self._nbr[a], self._wgt[a]
+            last_node, last_wgt = nbr_a.pop(), wgt_a.pop()
+            if k < len(nbr_a):
+                nbr_a[k], wgt_a[k] = last_node, last_wgt
+            index = self._index.get(a)
+            if index is not None:
+                del index[node]
+                if k < len(nbr_a):
+                    index[last_node] = k
 
         # ----- add new edge bypassing the current given node using its previous connections
-        self.add_edge(connections[0].node, connections[1].node, connections[0].distance+connections[1].distance)
+        self.add_edge(nbr[0], nbr[1], wgt[0]+wgt[1])
+
+
+    def _freeze(self):
 
+        '''
+            Get the adjacency of the graph in CSR (compressed sparse row) form, building it if the
+            graph was modified since the last call.
+
+            The neighbours of row u are indices[indptr[u]:indptr[u+1]], with the matching
+            distances in the same slice of weights. There is one row per node, numbered 0..N-1.
+
+            Rows are the node ids themselves when those are exactly 0..N-1 and reorder_rcm() has
+            not relabelled them. Otherwise node_to_idx (a dict) and idx_to_node (a NumPy array)
+            map node ids to rows and back, so sparse or non-contiguous ids (eg. after a contraction)
+            are only translated at the ends of a query; the Dijkstra loops index arrays by row.
+
+            @return                 the _CSR of (indptr, indices, weights, node_to_idx, idx_to_node)
+
+        '''
+        if self._frozen is None:
+
+            nodes = sorted(self._nbr)
+            indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+            np.cumsum([len(self._nbr[u]) for u in nodes], out=indptr[1:])
+
+            # ----- the arrays are already packed 64-bit values, so rows are copied straight from their buffers
+            weight_dtype = np.int64 if self._weight_type == 'q' else np.float64
+            indices = np.concatenate([np.frombuffer(self._nbr[u], dtype=np.int64) for u in nodes]) if nodes else np.empty(0, dtype=np.int64)
+            weights = np.concatenate([np.frombuffer(self._wgt[u], dtype=weight_dtype) for u in nodes]) if nodes else np.empty(0, dtype=weight_dtype)
+
+            self._frozen = _to_csr(np.array(nodes, dtype=np.int64), indptr, indices, weights)
+
+        return self._frozen
+
+    def _distance(self, d):
+        '''
+            Distances are accumulated as doubles, hand them back as ints when all the edge
+            distances of the graph are integers. Integer path lengths are therefore exact only up
+            to 2**53; longer ones come back rounded to the nearest double.
+
+        '''
+        return int(d) if self._weight_type == 'q' else float(d)
+
+    def _row(self, node):
+        '''
+            Get the row of a node in the frozen CSR form, which is the node id itself unless the
+            rows are mapped (see _freeze()). Only valid right after _freeze().
+
+        '''
+        node_to_idx = self._frozen.node_to_idx
+        return node if node_to_idx is None else int(node_to_idx[node])
+
+    def reorder_rcm(self):
+
+        '''
+            Relabel the rows of the frozen CSR form in reverse Cuthill-McKee order.
+
+            Each connected component is visited breadth first from a pseudo-peripheral node,
+            neighbours in increasing degree order, and the visiting order is reversed. This keeps
+            the neighbours of a node close to it in the distance arrays Dijkstra reads and writes,
+            which improves cache locality on large graphs. Node ids seen by the caller do not
+            change. Call it once before running many queries: modifying the graph drops the
+            reordering along with the frozen form.
+
+        '''
+        indptr, indices, weights, _, idx_to_node = self._freeze()
+
+        n = len(indptr) - 1
+        deg = np.diff(indptr)
+        ptr = indptr.tolist()
+        nbrs = indices.tolist()
+        degree = deg.tolist()
+
+        def bfs_levels(start):
+            # ----- breadth first levels of the component of start, neighbours by increasing degree
+            levels = [[start]]
+            seen = {start}
+            while True:
+                level = []
+                for u in levels[-1]:
+                    new = sorted({v for v in nbrs[ptr[u]:ptr[u + 1]] if v not in seen}, key=degree.__getitem__)
+                    seen.update(new)
+                    level.extend(new)
+                if not level:
+                    return levels
+                levels.append(level)
+
+        visited = bytearray(n)
+        order = []
+        for start in np.argsort(deg, kind='stable').tolist():
+            if visited[start]:
+                continue
+
+            # ----- pseudo-peripheral node: move to a min degree node of the last level while the depth grows
+            levels = bfs_levels(start)
+            while True:
+                candidate = min(levels[-1], key=degree.__getitem__)
+                candidate_levels = bfs_levels(candidate)
+                if len(candidate_levels) <= len(levels):
+                    break
+                start, levels = candidate, candidate_levels
+
+            for level in bfs_levels(start):
+                for u in level:
+                    visited[u] = 1
+                order.extend(level)
+
+        perm = np.array(order[::-1], dtype=np.int64)
+        id_map = np.empty(n, dtype=np.int64)
+        id_map[perm] = np.arange(n)
+
+        # ----- compose with the existing row -> node id map
+        idx_to_node = perm if idx_to_node is None else idx_to_node[perm]
+        node_to_idx = dict(zip(idx_to_node.tolist(), range(n)))
+
+        # ----- gather the rows in their new order and relabel the neighbours
+        new_deg = deg[perm]
+        new_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(new_deg, out=new_indptr[1:])
+        edges = np.repeat(indptr[:-1][perm] - new_indptr[:-1], new_deg) + np.arange(new_indptr[-1])
+
+        self._frozen = _CSR(new_indptr, id_map[indices[edges]], weights[edges], node_to_idx, idx_to_node)
+
+        # ----- cached distances are indexed by row, which just changed
+        self._sssp_cache.clear()
 
     def dijkstra_version_1(self, node1, node2):
 
@@ -136,35 +631,51 @@ class Graph:
             
         '''
 
-        if node1 not in self._graph:
+        if node1 not in self._nbr:
             raise GraphException("Node 1 '%d' does not exist in graph"%node1)
 
-        if node2 not in self._graph:
+        if node2 not in self._nbr:
             raise GraphException("Node 2 '%d' does not exist in graph"%node2)
 
 
+        # ----- work on the rows of the frozen CSR form, so node ids need not be 0..N-1
+        indptr, indices, weights = self._freeze()[:3]
+        src, dst = self._row(node1), self._row(node2)
+        indptr, indices, weights = indptr.tolist(), indices.tolist(), weights.tolist()
+
         # ----- set the distance of node1 to itself zero, and the distance of node1 to the other nodes infinite
-        D = [float('inf')] * len(self._graph)
-        D[node1] = 0 
+        D = array('d', [float('inf')]) * (len(indptr) - 1)
+        D[src] = 0 
 
         # ----- We use an auxiliary array ‘tight’ indexed by the vertices, that records for which nodes the shortest path estimates are ‘‘known’’ to be tight by the algorithm.
-        tight = [False]*len(self._graph)
+        tight = bytearray(len(indptr) - 1)
 
-        # ----- the actual algorithm
-        for i in range(len(tight)):
-            tight[i] = True
-            for connection in self._graph[i]:
-                if D[i] + connection.distance < D[connection.node]:
-                    D[connection.node] = D[i] + connection.distance
+        # ----- the actual algorithm: repeatedly make tight the non-tight node with the smallest estimate
+        for _ in range(len(tight)):
+            u = None
+            for i in range(len(tight)):
+                if not tight[i] and (u is None or D[i] < D[u]):
+                    u = i
 
-        return D[node2]
+            if D[u] == float('inf'):
+                break
+
+            tight[u] = 1
+            if u == dst:
+                return self._distance(D[u])
+
+            for k in range(indptr[u], indptr[u + 1]):
+                if D[u] + weights[k] < D[indices[k]]:
+                    D[indices[k]] = D[u] + weights[k]
+
+        raise GraphException("There is no path between node %d and node %d"%(node1, node2))
 
 
     def dijkstra_version_2(self, node1, node2):
 
         '''
             Apply Dijkstra's algorithm to find the distance between 2 nodes in the graph. Implemented according to John Bullinaria's lecture notes.
-            Uses priority queues to speed up.
+            Uses an indexed 4-ary heap with decrease-key as the priority queue to speed up.
             
             @param node1            the start node in the pair between which the distance is to be found
             @param node2            the final node in the pair between which the distance is to be found
@@ -176,42 +687,202 @@ class Graph:
             
         '''
 
-        # if node1 not in self._graph:
-        #     raise GraphException("Node 1 '%d' does not exist in graph"%node1)
+        if node1 not in self._nbr:
+            raise GraphException("Node 1 '%d' does not exist in graph"%node1)
+
+        if node2 not in self._nbr:
+            raise GraphException("Node 2 '%d' does not exist in graph"%node2)
+
+        self._freeze()
+        dst = self._row(node2)
+        d = self._dijkstra_rows(self._row(node1), dst)[dst]
+
+        if d == float('inf'):
+            raise GraphException("There is no path between node %d and node %d"%(node1, node2))
+
+        return self._distance(d)
+
+    def _dijkstra_rows(self, src, dst):
+
+        '''
+            The indexed heap Dijkstra behind dijkstra_version_2, on rows of the frozen CSR form.
+
+            @param src              the row to start from
+            @param dst              the row at which to stop, or -1 to settle every reachable row
+
+            @return                 the array of distances from src, final for every settled row
+
+        '''
+
+        indptr, indices, weights = self._freeze()[:3]
+
+        # ----- the heap keys double as the distance estimates D: src is at zero, every other row at infinity
+        pq = _IndexedDHeap(len(indptr) - 1)
+        D = pq.keys
+        pq.push_or_decrease(src, 0)
+
+        # ----- one byte per node marking those whose distance is final, so their edges are skipped outright
+        settled = bytearray(len(indptr) - 1)
+
+        # ----- NumPy view sharing D's buffer, for relaxing the edges of high degree rows in one go
+        D_view = np.frombuffer(D, dtype=np.float64)
+
+        # ----- local binds to avoid repeated attribute lookups in the hot loop
+        push = pq.push_or_decrease
+        pop = pq.pop_min
+        indptr = indptr.tolist()
+
+        while pq:
+            u, d = pop()
+            if u == dst:
+                break
+            settled[u] = 1
+
+            lo, hi = indptr[u], indptr[u + 1]
+            if hi - lo > _VECTORIZED_DEGREE:
+                # ----- settled rows can never improve (distances are non-negative), so no need to mask them
+                nbrs = indices[lo:hi]
+                cand = d + weights[lo:hi]
+                improved = cand < D_view[nbrs]
+                for v, nd in zip(nbrs[improved].tolist(), cand[improved].tolist()):
+                    push(v, nd)
+                continue
+
+            nbrs = indices[lo:hi].tolist()
+            w = weights[lo:hi].tolist()
+            for k in range(len(nbrs)):
+                v = nbrs[k]
+                if settled[v]:
+                    continue
+                nd = d + w[k]
+                if nd < D[v]:
+                    push(v, nd)
+
+        return D
+
+    def dijkstra_bidirectional(self, node1, node2):
+
+        '''
+            Find the distance between 2 nodes in the graph by running Dijkstra's algorithm from both
+            ends at once, always advancing the search whose next node is closer. As the graph is
+            undirected, the backward search walks the same CSR form as the forward one.
+
+            best holds the shortest node1-node2 path seen so far, through any edge joining the two
+            searches. Once the two smallest heap keys add up to at least best, no shorter path can
+            remain, so on sparse graphs far fewer nodes are settled than by a one-sided search.
 
-        # if node2 not in self._graph:
-        #     raise GraphException("Node 2 '%d' does not exist in graph"%node2)
+            @param node1            the start node in the pair between which the distance is to be found
+            @param node2            the final node in the pair between which the distance is to be found
+
+            @return                 the distance between the pair of nodes
+
+            @raises GraphException  if either of the nodes are not in the graph or there is no path
+                                        between them
+
+        '''
+
+        if node1 not in self._nbr:
+            raise GraphException("Node 1 '%d' does not exist in graph"%node1)
+
+        if node2 not in self._nbr:
+            raise GraphException("Node 2 '%d' does not exist in graph"%node2)
+
+        indptr, indices, weights = self._freeze()[:3]
+        n = len(indptr) - 1
+
+        hf, hb = _IndexedDHeap(n), _IndexedDHeap(n)
+        hf.push_or_decrease(self._row(node1), 0)
+        hb.push_or_decrease(self._row(node2), 0)
+        settled_f, settled_b = bytearray(n), bytearray(n)
+        best = 0 if node1 == node2 else float('inf')
 
+        indptr = indptr.tolist()
 
-        # # ----- set the distance of node1 to itself zero, and the distance of node1 to the other nodes infinite
-        # D = [float('inf')] * len(self._graph)
-        # D[node1] = 0 
+        while hf and hb:
+            top_f, top_b = hf.min_key(), hb.min_key()
+            if top_f + top_b >= best:
+                break
 
-        # # ----- Create a priority queue containing all the vertices of the graph, with the entries of D as the priorities
-        # pq = heapq.heapify(list(zip(D,[i for i in range(len(D))])))
+            # ----- advance the side with the closer next node
+            if top_f <= top_b:
+                pq, settled, other = hf, settled_f, hb.keys
+            else:
+                pq, settled, other = hb, settled_b, hf.keys
 
-        # # print (pq)
-        # # input()
-        # # pq = queue.PriorityQueue() 
-        # # for i in range(len(D)):
-        # #     pq.put((D[i], i))
+            u, d = pq.pop_min()
+            settled[u] = 1
+            D = pq.keys
 
-        # for i in range(len(pq)):
-        #     u = pq[i][1]
-        #     for connection in self._graph[u]:
-        #         if D[u] + connection.distance < D[connection.node]:
-        #             D[connection.node] = D[u] + connection.distance
-        #             # ----- change priority of the node in the priority queue... HOWW???
+            lo, hi = indptr[u], indptr[u + 1]
+            nbrs = indices[lo:hi].tolist()
+            w = weights[lo:hi].tolist()
+            for k in range(len(nbrs)):
+                v = nbrs[k]
+                nd = d + w[k]
 
-        # return D[node2]
-        raise NotImplementedError("Have to change priority of a node in the priority queue... How..?")
+                # ----- every edge reaching a node the other side has seen closes a node1-node2 path
+                if nd + other[v] < best:
+                    best = nd + other[v]
+
+                if not settled[v] and nd < D[v]:
+                    pq.push_or_decrease(v, nd)
+
+        if best == float('inf'):
+            raise GraphException("There is no path between node %d and node %d"%(node1, node2))
+
+        return self._distance(best)
 
     def dijkstra(self, node1, node2):
-        return self.dijkstra_version_2(node1, node2)
+
+        '''
+            Find the distance between 2 nodes in the graph, using the Numba-compiled CSR kernel
+            when numba is available and the indexed heap of dijkstra_version_2 otherwise.
+
+            The distances from node1 to every node are computed in full and cached for the most
+            recently used source nodes, so further queries from node1 are lookups until the graph
+            is modified.
+
+            @param node1            the start node in the pair between which the distance is to be found
+            @param node2            the final node in the pair between which the distance is to be found
+
+            @return                 the distance between the pair of nodes
+
+            @raises GraphException  if either of the nodes are not in the graph or there is no path
+                                        between them
+
+        '''
+
+        if node1 not in self._nbr:
+            raise GraphException("Node 1 '%d' does not exist in graph"%node1)
+
+        if node2 not in self._nbr:
+            raise GraphException("Node 2 '%d' does not exist in graph"%node2)
+
+        indptr, indices, weights = self._freeze()[:3]
+
+        cache = self._sssp_cache
+        D = cache.get(node1)
+        if D is None:
+            if sssp_csr is None:
+                D = self._dijkstra_rows(self._row(node1), -1)
+            else:
+                D = sssp_csr(indptr, indices, weights, self._row(node1))
+            cache[node1] = D
+            if len(cache) > _SSSP_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(node1)
+
+        d = D[self._row(node2)]
+
+        if d == float('inf'):
+            raise GraphException("There is no path between node %d and node %d"%(node1, node2))
+
+        return self._distance(d)
 
 
     def __str__(self):
-        return str(self._graph)
+        return str({u: [Connection(v, d) for v, d in zip(self._nbr[u], self._wgt[u])] for u in self._nbr})
 
 
         
@@ -0,0 +1,276 @@
+'''
+
+    Randomized regression test: every shortest path method must agree with dijkstra_version_2,
+    the reference, on graphs with sparse node ids, after reorder_rcm() and after contraction.
+
+    Run from the project root with:  python -m unittest
+
+'''
+
+import random
+import re
+import unittest
+from unittest import mock
+
+from src import graph as graph_module
+from src.graph import Graph, GraphException
+
+
+METHODS = ("dijkstra_version_1", "dijkstra_bidirectional", "dijkstra")
+
+
+def random_edges(rng, n, ids):
+
+    '''
+        A random connected-ish graph over the given node ids, with parallel edges and a hub whose
+        degree is large enough to take the vectorized relaxation branch
+
+    '''
+    edges = [[ids[i], ids[rng.randrange(i)], rng.randint(0, 20)] for i in range(1, n)]
+    for _ in range(rng.randint(0, 2 * n)):
+        edges.append([ids[rng.randrange(n)], ids[rng.randrange(n)], rng.randint(0, 20)])
+    hub = ids[rng.randrange(n)]
+    for _ in range(40):
+        edges.append([hub, ids[rng.randrange(n)], rng.randint(0, 20)])
+    return edges
+
+
+def distance(graph, method, node1, node2):
+    try:
+        return getattr(graph, method)(node1, node2)
+    except GraphException:
+        return None
+
+
+class TestDijkstraAgreement(unittest.TestCase):
+
+    def assert_agree(self, graph, nodes, rng, queries = 20):
+        for _ in range(queries):
+            node1, node2 = rng.choice(nodes), rng.choice(nodes)
+            expected = distance(graph, "dijkstra_version_2", node1, node2)
+            for method in METHODS:
+                self.assertEqual(distance(graph, method, node1, node2), expected, (method, node1, node2))
+
+    def test_sparse_ids_rcm_and_contraction(self):
+        rng = random.Random(0)
+        for _ in range(30):
+            n = rng.randint(3, 40)
+            ids = rng.sample(range(10 * n), n)
+            graph = Graph(random_edges(rng, n, ids))
+            nodes = sorted({node for edge in graph.get_connections() for node in edge[:2]})
+            self.assert_agree(graph, nodes, rng)
+
+            graph.reorder_rcm()
+            self.assert_agree(graph, nodes, rng)
+
+            # ----- contract every node that has exactly two edges and no self-loop, one at a time
+            for node in nodes:
+                connections = [edge for edge in graph.get_connections() if edge[0] == node]
+                if len(connections) == 2 and all(edge[1] != node for edge in connections):
+                    graph.contract_node_with_two_edges(node)
+                    nodes.remove(node)
+                    self.assert_agree(graph, nodes, rng, queries = 5)
+
+
+class TestConstructor(unittest.TestCase):
+
+    def test_rejects_connections_without_three_values(self):
+        with self.assertRaisesRegex(GraphException, r"This connection did not: \[1, 2\]"):
+            Graph([[0, 1, 1], [1, 2]])
+        with self.assertRaisesRegex(GraphException, r"This connection did not: \[1, 2, 3, 4\]"):
+            Graph([[0, 1, 1], [1, 2, 3, 4]])
+
+    def test_rejects_negative_distances_naming_the_edge(self):
+        with self.assertRaisesRegex(GraphException, "attempted to add node 1 to node 2 with distance -3"):
+            Graph([[0, 1, 1], [1, 2, -3], [2, 3, -4]])
+
+    def test_rejects_non_integral_node_ids_naming_the_edge(self):
+        for bad in ([2, 0.5, 1], [2, float('nan'), 1], [2, 'x', 1], [2, None, 1], [2**70, 2, 1], [1e30, 2, 1]):
+            with self.assertRaisesRegex(GraphException, re.escape("Node ids must be integers: attempted to add node %s to node %s with distance 1"%tuple(bad[:2]))):
+                Graph([[0, 1, 1], [1, 2, 2], bad])
+
+    def test_accepts_integral_float_ids_and_large_distances(self):
+        self.assertEqual(Graph([[0, 1, 2.5], [1.0, 2, 1]]).get_connections(), [[0, 1, 2.5], [1, 0, 2.5], [1, 2, 1.0], [2, 1, 1.0]])
+        self.assertEqual(Graph([[0, 1, 1], [1, 2, 2**70]]).dijkstra(0, 2), 1.0 + 2**70)
+
+
+class TestAddEdge(unittest.TestCase):
+
+    def test_rejects_non_integral_node_ids_without_changing_the_graph(self):
+        for node1, node2 in (('a', 1), (1, 2.5), (None, 1), (2**63, 1), (1, -2**63 - 1)):
+            graph = Graph([[0, 1, 2]])
+            with self.assertRaisesRegex(GraphException, re.escape("Node ids must be integers: attempted to add node %s to node %s with distance 1"%(node1, node2))):
+                graph.add_edge(node1, node2, 1)
+            self.assertEqual(graph.get_connections(), [[0, 1, 2], [1, 0, 2]])
+            self.assertEqual(graph.dijkstra(0, 1), 2)
+
+            graph.add_edge(1, 2, 3)
+            self.assertEqual(graph.dijkstra(0, 2), 5)
+
+
+class TestGetConnections(unittest.TestCase):
+
+    def test_edges_are_listed_by_source_node(self):
+        graph = Graph()
+        for edge in ([3, 1, 1], [0, 2, 5], [2, 1, 2], [2, 4, 1]):
+            graph.add_edge(*edge)
+        expected = [[0, 2, 5], [1, 3, 1], [1, 2, 2], [2, 0, 5], [2, 1, 2], [2, 4, 1], [3, 1, 1], [4, 2, 1]]
+        self.assertEqual(graph.get_connections(), expected)
+
+        graph.reorder_rcm()
+        self.assertEqual(graph.get_connections(), expected)
+
+        self.assertEqual(Graph([[3, 1, 1], [0, 2, 5], [2, 1, 2]]).get_connections(), [[0, 2, 5], [1, 2, 2], [1, 3, 1], [2, 0, 5], [2, 1, 2], [3, 1, 1]])
+
+    def test_contraction_moves_the_last_edge_into_the_removed_place(self):
+        graph = Graph()
+        for edge in ([1, 5, 1], [1, 2, 2], [2, 3, 3], [1, 4, 4]):
+            graph.add_edge(*edge)
+        graph.contract_node_with_two_edges(2)
+        self.assertEqual(graph.get_connections(), [[1, 5, 1], [1, 4, 4], [1, 3, 5], [3, 1, 5], [4, 1, 4], [5, 1, 1]])
+
+    def test_node_ids_stay_ints_with_float_distances(self):
+        expected = [[0, 2, 0.5], [1, 2, 2.0], [2, 0, 0.5], [2, 1, 2.0], [2, 7, 1.5], [7, 2, 1.5]]
+
+        # ----- float distances from the constructor, and int distances turned into floats by add_edge()
+        from_floats = Graph([[0, 2, 0.5], [2, 1, 2]])
+        from_floats.add_edge(7, 2, 1.5)
+
+        from_ints = Graph([[0, 2, 1], [2, 1, 2]])
+        from_ints.add_edge(7, 2, 1.5)
+        from_ints.add_edge(0, 2, 0.5)
+
+        for graph in (from_floats, from_ints):
+            self.assertEqual(graph.get_connections(), expected)
+            for node1, node2, distance in graph.get_connections():
+                self.assertEqual((type(node1), type(node2), type(distance)), (int, int, float))
+
+        for node1, node2, distance in Graph([[0, 1, 2], [1, 2, 3]]).get_connections():
+            self.assertEqual((type(node1), type(node2), type(distance)), (int, int, int))
+
+
+class TestEdgeMerging(unittest.TestCase):
+
+    def test_self_loop_is_listed_once(self):
+        graph = Graph([[0, 1, 1], [1, 1, 5]])
+        self.assertEqual(graph.get_connections(), [[0, 1, 1], [1, 0, 1], [1, 1, 5]])
+
+        graph = Graph([[0, 1, 1]])
+        graph.add_edge(1, 1, 5)
+        self.assertEqual(graph.get_connections(), [[0, 1, 1], [1, 0, 1], [1, 1, 5]])
+
+    def test_parallel_edges_keep_the_shortest_distance(self):
+        expected = [[0, 1, 2], [1, 0, 2], [1, 2, 1], [2, 1, 1]]
+        self.assertEqual(Graph([[0, 1, 5], [1, 0, 2], [0, 1, 3], [1, 2, 1]]).get_connections(), expected)
+
+        graph = Graph([[0, 1, 5], [1, 2, 1]])
+        graph.add_edge(1, 0, 2)
+        graph.add_edge(0, 1, 3)
+        self.assertEqual(graph.get_connections(), expected)
+
+    def test_parallel_edges_merge_on_a_high_degree_row(self):
+        graph = Graph([[0, node, 10] for node in range(1, 101)])
+        for node in range(1, 101):
+            graph.add_edge(node, 0, node % 10)
+        self.assertEqual(graph.get_connections()[:3], [[0, 1, 1], [0, 2, 2], [0, 3, 3]])
+        self.assertEqual(len(graph.get_connections()), 200)
+
+
+class TestContraction(unittest.TestCase):
+
+    def test_contraction_lowers_an_existing_edge_only_if_shorter(self):
+        graph = Graph([[0, 1, 1], [1, 2, 2], [0, 2, 10]])
+        graph.contract_node_with_two_edges(1)
+        self.assertEqual(graph.get_connections(), [[0, 2, 3], [2, 0, 3]])
+
+        graph = Graph([[0, 1, 1], [1, 2, 2], [0, 2, 1]])
+        graph.contract_node_with_two_edges(1)
+        self.assertEqual(graph.get_connections(), [[0, 2, 1], [2, 0, 1]])
+
+    def test_contraction_rejects_a_node_with_a_self_loop(self):
+        graph = Graph([[0, 1, 1], [1, 1, 5]])
+        with self.assertRaisesRegex(GraphException, "The node '1' to be contracted has a self-loop"):
+            graph.contract_node_with_two_edges(1)
+        self.assertEqual(graph.get_connections(), [[0, 1, 1], [1, 0, 1], [1, 1, 5]])
+
+    def test_contraction_rejects_a_node_without_two_edges(self):
+        graph = Graph([[0, 1, 1], [1, 2, 2], [1, 3, 3]])
+        with self.assertRaisesRegex(GraphException, "has to be 2. It was 3"):
+            graph.contract_node_with_two_edges(1)
+        with self.assertRaisesRegex(GraphException, "Graph does not have the given node: 7"):
+            graph.contract_node_with_two_edges(7)
+
+
+class TestIntegerDistances(unittest.TestCase):
+
+    def test_integer_path_lengths_are_exact_up_to_2_to_the_53(self):
+        for method in ("dijkstra_version_1", "dijkstra_version_2", "dijkstra_bidirectional", "dijkstra"):
+            graph = Graph([[0, 1, 2**53 - 1], [1, 2, 1]])
+            self.assertIs(type(getattr(graph, method)(0, 2)), int)
+            self.assertEqual(getattr(graph, method)(0, 2), 2**53)
+
+            # ----- past 2**53 the sum is rounded as a double: 2**53 + 2 comes back as 2**53
+            graph = Graph([[0, 1, 2**53 + 1], [1, 2, 1]])
+            self.assertEqual(getattr(graph, method)(0, 2), 2**53)
+
+
+class TestDistanceCache(unittest.TestCase):
+
+    def path_graph(self):
+        return Graph([[0, 1, 1], [1, 2, 2], [2, 3, 4], [3, 4, 8]])
+
+    def test_add_edge_drops_cached_distances(self):
+        graph = self.path_graph()
+        self.assertEqual(graph.dijkstra(0, 4), 15)
+        graph.add_edge(0, 4, 3)
+        self.assertEqual(len(graph._sssp_cache), 0)
+        self.assertEqual(graph.dijkstra(0, 4), 3)
+
+    def test_contraction_drops_cached_distances(self):
+        # ----- contracting node 1 shifts the rows of nodes 2..4, a stale row would give the distance to node 3
+        graph = self.path_graph()
+        self.assertEqual(graph.dijkstra(0, 4), 15)
+        graph.contract_node_with_two_edges(1)
+        self.assertEqual(len(graph._sssp_cache), 0)
+        self.assertEqual(graph.dijkstra(0, 4), 15)
+        self.assertEqual(graph.dijkstra(0, 3), 7)
+
+    def test_reorder_rcm_drops_cached_distances(self):
+        rng = random.Random(1)
+        graph = Graph(random_edges(rng, 30, list(range(30))))
+        before = {(node1, node2): graph.dijkstra(node1, node2) for node1 in range(0, 30, 7) for node2 in range(30)}
+        graph.reorder_rcm()
+        self.assertEqual(len(graph._sssp_cache), 0)
+        self.assertEqual({pair: graph.dijkstra(*pair) for pair in before}, before)
+
+    def test_least_recently_used_source_is_evicted(self):
+        size = graph_module._SSSP_CACHE_SIZE
+        graph = Graph([[node, node + 1, 1] for node in range(size + 1)])
+        for node in range(size):
+            graph.dijkstra(node, 0)
+        graph.dijkstra(0, 1)
+        graph.dijkstra(size, 0)
+        self.assertEqual(list(graph._sssp_cache), list(range(2, size)) + [0, size])
+
+
+class TestPurePythonFallback(unittest.TestCase):
+
+    def test_dijkstra_without_numba(self):
+        rng = random.Random(2)
+        with mock.patch.object(graph_module, "sssp_csr", None):
+            for _ in range(10):
+                n = rng.randint(3, 60)
+                ids = rng.sample(range(10 * n), n)
+                graph = Graph(random_edges(rng, n, ids))
+                for _ in range(20):
+                    node1, node2 = rng.choice(ids), rng.choice(ids)
+                    self.assertEqual(distance(graph, "dijkstra", node1, node2), distance(graph, "dijkstra_version_2", node1, node2))
+
+            graph = Graph([[0, 1, 0.5], [1, 2, 1]])
+            self.assertIs(type(graph.dijkstra(0, 2)), float)
+            self.assertEqual(graph.dijkstra(0, 2), 1.5)
+            self.assertIs(type(Graph([[0, 1, 2]]).dijkstra(0, 1)), int)
+
+
+if __name__ == '__main__':
+    unittest.main()